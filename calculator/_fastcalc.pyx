@@ -0,0 +1,227 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled versions of the calculator's tokenizer and bytecode VM.
+
+calculator.py imports them when the extension is built with
+'python setup.py build_ext --inplace' and falls back to its
+pure Python versions otherwise.
+"""
+import sys
+
+cimport cython
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from libc.limits cimport LONG_MIN, LONG_MAX
+
+
+# opcodes of the compiled expression bytecode, as in calculator.py
+cdef enum:
+    PUSH_CONST = 0
+    LOAD_VAR = 1
+    ADD = 2
+    SUB = 3
+    MUL = 4
+    DIV = 5
+    POW = 6
+    NEG = 7
+
+# kinds of the tokens, as in calculator.py
+cdef enum:
+    NUM = 0
+    VAR = 1
+    OP = 2
+    LPAR = 3
+    RPAR = 4
+
+
+cdef inline bint is_letter(Py_UCS4 ch):
+    # the letters of the variables, as [^\W\d_] of calculator._TOKEN_RE
+    return ch.isalnum() and not ch.isdecimal()
+
+
+def tokenize(str expr):
+    """
+    Return array representation of an expression, the same as
+    calculator.to_array does. Raise ValueError if '*', '/', '^'
+    follow one another.
+
+    Arguments:
+    expr -- initial expression (string).
+    Return value:
+    arr -- array of (kind, value) tokens created from expr.
+    """
+    cdef Py_ssize_t n = len(expr)
+    cdef Py_ssize_t i = 0
+    cdef Py_ssize_t start
+    cdef Py_UCS4 ch
+    cdef bint prev_mul = False
+    cdef bint minus
+    arr = []
+    while i < n:
+        ch = expr[i]
+        start = i
+        if ch.isdecimal():
+            i += 1
+            while i < n and expr[i].isdecimal():
+                i += 1
+            arr.append((NUM, int(expr[start:i])))
+            prev_mul = False
+        elif is_letter(ch):
+            i += 1
+            while i < n and is_letter(expr[i]):
+                i += 1
+            arr.append((VAR, sys.intern(expr[start:i])))
+            prev_mul = False
+        elif ch == '+' or ch == '-':
+            minus = False
+            while i < n and (expr[i] == '+' or expr[i] == '-'):
+                if expr[i] == '-':
+                    minus = not minus
+                i += 1
+            arr.append((OP, '-' if minus else '+'))
+            prev_mul = False
+        elif ch == '*' or ch == '/' or ch == '^':
+            if prev_mul:
+                raise ValueError(expr)
+            prev_mul = True
+            i += 1
+            if ch == '*':
+                arr.append((OP, '*'))
+            elif ch == '/':
+                arr.append((OP, '/'))
+            else:
+                arr.append((OP, '^'))
+        elif ch == '(':
+            i += 1
+            arr.append((LPAR, '('))
+            prev_mul = False
+        elif ch == ')':
+            i += 1
+            arr.append((RPAR, ')'))
+            prev_mul = False
+        else:
+            # spaces and unknown characters are skipped
+            i += 1
+    return arr
+
+
+# arithmetic on C longs raising OverflowError instead of wrapping,
+# so that calculator.py can redo the calculation with Python ints
+cdef inline long checked_add(long a, long b) except? -1:
+    if (b > 0 and a > LONG_MAX - b) or (b < 0 and a < LONG_MIN - b):
+        raise OverflowError("C long overflow")
+    return a + b
+
+
+cdef inline long checked_sub(long a, long b) except? -1:
+    if (b < 0 and a > LONG_MAX + b) or (b > 0 and a < LONG_MIN + b):
+        raise OverflowError("C long overflow")
+    return a - b
+
+
+@cython.cdivision(True)
+cdef inline long checked_mul(long a, long b) except? -1:
+    if a > 0:
+        if (b > 0 and a > LONG_MAX // b) or (b < 0 and b < LONG_MIN // a):
+            raise OverflowError("C long overflow")
+    elif a < 0:
+        if (b > 0 and a < LONG_MIN // b) or (b < 0 and b < LONG_MAX // a):
+            raise OverflowError("C long overflow")
+    return a * b
+
+
+cdef inline long checked_neg(long a) except? -1:
+    if a == LONG_MIN:
+        raise OverflowError("C long overflow")
+    return -a
+
+
+cdef long int_pow(long a, long b) except? -1:
+    cdef long result = 1
+    if b < 0:
+        # the result is not an integer
+        raise ValueError("negative exponent")
+    while b:
+        if b & 1:
+            result = checked_mul(result, a)
+        b >>= 1
+        if b:
+            a = checked_mul(a, a)
+    return result
+
+
+cdef class VM:
+    """
+    The bytecode VM for one program compiled by calculator.compile_expr.
+    Values are limited to C long integers: eval() raises OverflowError
+    if a result does not fit.
+    """
+    cdef int[::1] code
+    cdef long[::1] consts
+
+    def __init__(self, code, consts):
+        """
+        Arguments:
+        code -- array('i') of opcodes with their arguments;
+        consts -- array('l') of the integer literals.
+        """
+        self.code = code
+        self.consts = consts
+
+    def eval(self, long[::1] var_values):
+        """
+        Run the bytecode and return the result.
+
+        Arguments:
+        var_values -- array('l') of the variables' values,
+                      indexed like the program's names.
+        Return value:
+        calculated result.
+        """
+        cdef Py_ssize_t end = self.code.shape[0]
+        cdef Py_ssize_t ip = 0
+        cdef Py_ssize_t sp = 0
+        cdef int op
+        cdef long a, b
+        cdef long *stack = <long *> PyMem_Malloc(end * sizeof(long))
+        if stack == NULL:
+            raise MemoryError()
+        try:
+            while ip < end:
+                op = self.code[ip]
+                if op == PUSH_CONST:
+                    stack[sp] = self.consts[self.code[ip + 1]]
+                    sp += 1
+                    ip += 2
+                elif op == LOAD_VAR:
+                    stack[sp] = var_values[self.code[ip + 1]]
+                    sp += 1
+                    ip += 2
+                elif op == NEG:
+                    if sp < 1:
+                        raise IndexError("pop from empty list")
+                    stack[sp - 1] = checked_neg(stack[sp - 1])
+                    ip += 1
+                else:
+                    if sp < 2:
+                        raise IndexError("pop from empty list")
+                    sp -= 1
+                    b = stack[sp]
+                    a = stack[sp - 1]
+                    if op == ADD:
+                        stack[sp - 1] = checked_add(a, b)
+                    elif op == SUB:
+                        stack[sp - 1] = checked_sub(a, b)
+                    elif op == MUL:
+                        stack[sp - 1] = checked_mul(a, b)
+                    elif op == DIV:
+                        # floors and checks for zero and overflow,
+                        # as cdivision is off
+                        stack[sp - 1] = a // b
+                    else:
+                        stack[sp - 1] = int_pow(a, b)
+                    ip += 1
+            if sp == 0:
+                raise IndexError("pop from empty list")
+            return stack[sp - 1]
+        finally:
+            PyMem_Free(stack)
@@ -1,5 +1,31 @@
+import ast
 import re
-from collections import deque
+import sys
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    # run as 'python -m calculator.calculator' or as a script
+    if __package__:
+        from ._fastcalc import tokenize as _fast_tokenize, VM as _FastVM
+    else:
+        from _fastcalc import tokenize as _fast_tokenize, VM as _FastVM
+except ImportError:
+    _fast_tokenize = _FastVM = None
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# whether _run_native below runs programs natively
+_NATIVE_VM = _FastVM is not None or njit is not None
 
 
 class CommandException(Exception):
@@ -27,8 +53,11 @@ class UnknownVarError(Exception):
         return "Unknown variable"
 
 
-def is_empty(inp):
-    return not len(inp)
+# error codes returned by Calculator.assign_valid,
+# indexes of the error messages in _ASSIGN_ERRORS
+ASSIGNMENT_ERROR, IDENTIFIER_ERROR, UNKNOWN_VAR_ERROR = range(3)
+_ASSIGN_ERRORS = (str(AssignmentError()), str(IdentifierError()),
+                  str(UnknownVarError()))
 
 
 def is_command(inp):
@@ -36,6 +65,8 @@ def is_command(inp):
 
 
 def is_variable(inp):
+    if ' ' not in inp:
+        return inp.isalpha()
     return inp.replace(' ', '').isalpha()
 
 
@@ -43,102 +74,507 @@ def is_assignment(inp):
     return "=" in inp
 
 
-# order of operators' precedence:
-# the higher number, the higher precedence
-precedence = {'(': 4, ')': 4, '^': 3, '*': 2, '/': 2, '+': 1, '-': 1}
+def parse_int(inp):
+    """
+    Return the value of a number with an optional minus sign,
+    or None if int() cannot parse it, e.g. '--5' or '²',
+    which pass the isdigit() check.
+    """
+    if not inp.lstrip("-").isdigit():
+        return None
+    try:
+        return int(inp)
+    except ValueError:
+        return None
 
 
-def to_postfix(infix):
-    """
-    Convert an infix expression to a postfix one.
-    The function uses stack for the converting.
+# order of operators' precedence, indexed by ord() of the operator:
+# the higher number, the higher precedence
+_PREC = [0] * 128
+_PREC[ord('(')] = _PREC[ord(')')] = 5
+_PREC[ord('^')] = 4
+# '~' stands for the unary minus
+_PREC[ord('~')] = 3
+_PREC[ord('*')] = _PREC[ord('/')] = 2
+_PREC[ord('+')] = _PREC[ord('-')] = 1
+_PREC = tuple(_PREC)
 
-    Arguments:
-    infix -- list form of the infix (split by characters).
-    Return value:
-    postfix -- list in the postfix format.
-    """
-    stack = deque()
-    postfix = []
-    for el in infix:
-        if el.isdigit() or el.isalpha():
-            postfix.append(el)
-        elif el == '(':
-            stack.append(el)
-        # if el == ')', append the postfix with popped values
-        # from the stack until '(' is faced. Discard the parentheses.
-        elif el == ')':
-            while stack[-1] != '(':
-                postfix.append(stack.pop())
-            stack.pop()
-        # if the stack is empty, or the peek is left parenthesis, or
-        # prec(el) > prec(peek), append the stack with the incoming element.
-        elif len(stack) == 0 \
-                or stack[-1] == '(' \
-                or precedence[el] > precedence[stack[-1]]:
-            stack.append(el)
-        # if the stack is not empty and prec(el) <= prec(peek), append
-        # the postfix with popped stack values until one of that if false.
-        else:
-            while len(stack) and \
-                    precedence[el] <= precedence[stack[-1]]:
-                postfix.append(stack.pop())
-            stack.append(el)
-    # pop all the stack values and append the postfix with them.
-    for _ in range(len(stack)):
-        postfix.append(stack.pop())
-    return postfix
+# opcodes of the compiled expression bytecode; PUSH_CONST and
+# LOAD_VAR take one argument, an index into the consts/names table
+PUSH_CONST, LOAD_VAR, ADD, SUB, MUL, DIV, POW, NEG = range(8)
+OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, '^': POW, '~': NEG}
 
 
 def check_expr(expr):
     """
     Check a calculation expression for correctness:
-    parentheses must be paired, no more than 1 '*', '/', '^'
-    symbol in a row. Otherwise, raise an exception.
+    parentheses must be paired and none may be closed before
+    it is opened. Otherwise, raise an exception.
+    Repeated '*', '/', '^' operators are rejected by to_array.
     Arguments:
     expr -- a string expression to be evaluated.
     Return value: None
     """
-    if expr.count('(') != expr.count(')'):
-        raise ExpressionError
-    elif re.search("[*/^]{2,}", expr) is not None:
+    depth = 0
+    for ch in expr:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth < 0:
+                raise ExpressionError
+    if depth:
         raise ExpressionError
 
 
+# kinds of the tokens produced by to_array
+NUM, VAR, OP, LPAR, RPAR = range(5)
+
+# numbers, variables, runs of +/- and the other operators;
+# spaces and unknown characters are skipped by finditer().
+# Variables are runs of the letters isalpha() accepts in names.
+_TOKEN_RE = re.compile(r'(\d+)|([^\W\d_]+)|([+\-]+)|([*/^()])')
+
+# whether to_array tokenizes ASCII expressions with Hyperscan (if it is
+# installed). Off by default: the Python callback of every match makes
+# the scan slower than finditer(), for single and batched expressions.
+USE_HYPERSCAN = False
+
+if hyperscan is None:
+    _HS_DB = None
+else:
+    # the patterns of the groups of _TOKEN_RE for ASCII expressions
+    # (the Unicode tables of Hyperscan are older than those of re);
+    # every pattern has an id of its own, as Hyperscan reports one
+    # match per id and end offset
+    _HS_PATTERNS = (rb'[0-9]+', rb'[A-Za-z]+', rb'[+\-]+', rb'[*/^()]')
+    # the _TOKEN_RE group of each id
+    _HS_GROUPS = tuple(range(1, len(_HS_PATTERNS) + 1))
+    _HS_DB = hyperscan.Database()
+    _HS_DB.compile(expressions=list(_HS_PATTERNS),
+                   ids=list(range(len(_HS_PATTERNS))),
+                   elements=len(_HS_PATTERNS),
+                   flags=[hyperscan.HS_FLAG_SOM_LEFTMOST]
+                   * len(_HS_PATTERNS))
+
+
+def _tokenize_hs(expr):
+    """
+    Scan an expression with the Hyperscan database and return
+    the same (group, text) matches as _TOKEN_RE.finditer gives.
+
+    Arguments:
+    expr -- initial expression (ASCII string).
+    Return value:
+    list of (group of _TOKEN_RE, matched text).
+    """
+    data = expr.encode('ascii')
+    # the longest match of each start offset
+    longest = {}
+
+    def on_match(pattern_id, start, end, flags, context):
+        if end > longest.get(start, (0, 0))[1]:
+            longest[start] = (_HS_GROUPS[pattern_id], end)
+
+    _HS_DB.scan(data, match_event_handler=on_match)
+    matches = []
+    pos = 0
+    for start in sorted(longest):
+        if start >= pos:
+            group, pos = longest[start]
+            matches.append((group, data[start:pos].decode()))
+    return matches
+
+
 def to_array(expr):
     """
     Return array representation of an expression.
     Divide the expression by numbers, variables,
-    operands +, -, *, /, and parentheses.
+    operands +, -, *, /, ^, and parentheses in a single scan
+    (compiled if available, otherwise Hyperscan if USE_HYPERSCAN
+    is set, or regex).
+    Raise ExpressionError if '*', '/', '^' follow one another.
 
     Arguments:
     expr -- initial expression (string).
     Return value:
-    arr -- array, created from expr.
+    arr -- array of (kind, value) tokens created from expr, where kind
+           is NUM (value is an int), VAR (an interned name), OP, LPAR
+           or RPAR (the operator or parenthesis).
     """
+    if _fast_tokenize is not None:
+        try:
+            return _fast_tokenize(expr)
+        except ValueError:
+            raise ExpressionError
+    if USE_HYPERSCAN and _HS_DB is not None and expr.isascii():
+        matches = _tokenize_hs(expr)
+    else:
+        matches = ((m.lastindex, m.group()) for m in _TOKEN_RE.finditer(expr))
     arr = []
-    i = 0
-    while i < len(expr):
-        if expr[i].isalpha() or expr[i].lstrip('-').isdigit():
-            arr.append(expr[i])
-            while i < len(expr) - 1 and \
-                    (expr[i + 1].isalpha() or expr[i + 1].lstrip('-').isdigit()):
-                arr[-1] += expr[i + 1]
-                i += 1
-        elif expr[i] == '(' or expr[i] == ')' \
-                or expr[i] == '*' or expr[i] == '/':
-            arr.append(expr[i])
-        elif expr[i] == '^':
-            arr.append('**')
-        elif re.match("[+|-]+", expr[i:]):
-            operator = re.match("[+|-]+", expr[i:]).group(0)
-            i += len(operator) - 1
-            operator = '-' if operator.count('-') % 2 else '+'
-            arr.append(operator)
-        i += 1
+    prev_mul = False
+    for group, token in matches:
+        if group == 1:
+            arr.append((NUM, int(token)))
+        elif group == 2:
+            arr.append((VAR, sys.intern(token)))
+        elif group == 3:
+            arr.append((OP, '-' if token.count('-') & 1 else '+'))
+        elif token == '(':
+            arr.append((LPAR, token))
+        elif token == ')':
+            arr.append((RPAR, token))
+        else:
+            if prev_mul:
+                raise ExpressionError
+            prev_mul = True
+            arr.append((OP, token))
+            continue
+        prev_mul = False
     return arr
 
 
+@lru_cache(maxsize=512)
+def compile_expr(src):
+    """
+    Compile a calculation expression to bytecode.
+    The expression is checked and converted to array once, and the
+    infix array is emitted as postfix bytecode directly, using a stack
+    of operators. A '+' or '-' where an operand is expected is unary.
+    Raise ExpressionError if operands and operators are not in turn.
+    An expression without variables is calculated right away and
+    compiled to a single PUSH_CONST of the result.
+    The result is cached by the source string.
+
+    Arguments:
+    src -- a string expression to be evaluated.
+    Return value:
+    code -- array of opcodes with their arguments;
+    consts -- tuple of the integer literals;
+    names -- tuple of the variable names;
+    native -- the program prepared for _run_native, or None.
+    """
+    check_expr(src)
+    code = array('i')
+    emit = code.append
+    consts = []
+    # slots of the variables in 'names'
+    slots = {}
+    ops = []
+    # whether an operand (or '(') is expected next
+    operand = True
+    for kind, el in to_array(src):
+        if kind == NUM or kind == VAR:
+            if not operand:
+                raise ExpressionError
+            operand = False
+            if kind == NUM:
+                code.extend((PUSH_CONST, len(consts)))
+                consts.append(el)
+            else:
+                code.extend((LOAD_VAR, slots.setdefault(el, len(slots))))
+        elif kind == LPAR:
+            if not operand:
+                raise ExpressionError
+            ops.append(el)
+        # if el == ')', emit the operators popped from the stack
+        # until '(' is faced. Discard the parentheses.
+        elif kind == RPAR:
+            if operand:
+                raise ExpressionError
+            while ops[-1] != '(':
+                emit(OPCODES[ops.pop()])
+            ops.pop()
+        # while the stack is not empty, the peek is not left parenthesis
+        # and prec(el) <= prec(peek), emit the popped operators.
+        # Then append the stack with the incoming operator.
+        elif operand:
+            # a prefix operator has no left operand to pop operators for
+            if el == '-':
+                ops.append('~')
+            elif el != '+':
+                raise ExpressionError
+        else:
+            operand = True
+            prec = _PREC[ord(el)]
+            # '^' is right-associative, so it does not pop another '^'
+            if el == '^':
+                prec += 1
+            top = ops[-1] if ops else '('
+            while top != '(' and prec <= _PREC[ord(top)]:
+                emit(OPCODES[ops.pop()])
+                top = ops[-1] if ops else '('
+            ops.append(el)
+    if operand:
+        raise ExpressionError
+    # emit all the remaining operators.
+    for el in reversed(ops):
+        emit(OPCODES[el])
+    if not slots:
+        return (array('i', (PUSH_CONST, 0)), (_eval_vm(code, consts, ()),),
+                (), None)
+    consts = tuple(consts)
+    native = _native_program(code, consts) if _NATIVE_VM else None
+    return code, consts, tuple(slots), native
+
+
+# the only AST nodes a calculation expression may consist of
+_SAFE_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load,
+               ast.Constant, ast.Add, ast.Sub, ast.Mult, ast.FloorDiv,
+               ast.Pow, ast.USub)
+# AST nodes of the binary opcodes
+_AST_OPS = {ADD: ast.Add, SUB: ast.Sub, MUL: ast.Mult, DIV: ast.FloorDiv,
+            POW: ast.Pow}
+# globals for evaluating the compiled expressions, without builtins
+_EVAL_GLOBALS = {'__builtins__': {}}
+# variable names that ast.Name cannot hold, as they are Python constants
+_CONST_NAMES = frozenset(('True', 'False', 'None'))
+
+
+@lru_cache(maxsize=512)
+def _safe_compile(src):
+    """
+    Compile a calculation expression to a Python code object.
+    The bytecode of compile_expr is lowered to a Python AST, so both
+    have the same semantics, and the tree must consist of _SAFE_NODES
+    only. Otherwise, raise ExpressionError. Variables named like the
+    Python constants, e.g. 'True', are looked up like the others.
+    The result is cached by the source string.
+
+    Arguments:
+    src -- a string expression to be evaluated.
+    Return value:
+    code object to be run by eval() with the variables as locals.
+    """
+    code, consts, names, _ = compile_expr(src)
+    # placeholders of the _CONST_NAMES variables, which cannot clash
+    # with the (alphabetic) names of the other variables
+    renamed = {}
+    stack = []
+    ip = 0
+    while ip < len(code):
+        op = code[ip]
+        if op == PUSH_CONST:
+            stack.append(ast.Constant(consts[code[ip + 1]]))
+            ip += 2
+        elif op == LOAD_VAR:
+            name = names[code[ip + 1]]
+            if name in _CONST_NAMES:
+                renamed[f'_{name}'] = name
+                name = f'_{name}'
+            stack.append(ast.Name(name, ast.Load()))
+            ip += 2
+        elif op == NEG:
+            stack.append(ast.UnaryOp(ast.USub(), stack.pop()))
+            ip += 1
+        else:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(ast.BinOp(a, _AST_OPS[op](), b))
+            ip += 1
+    tree = ast.Expression(stack.pop())
+    for node in ast.walk(tree):
+        # folded constants may be floats, e.g. of '2 ^ -1'
+        if not isinstance(node, _SAFE_NODES) \
+                or isinstance(node, ast.Constant) \
+                and type(node.value) not in (int, float):
+            raise ExpressionError
+    try:
+        code = compile(ast.fix_missing_locations(tree), '<expr>', 'eval')
+    except (ValueError, SyntaxError, RecursionError):
+        raise ExpressionError
+    # the code object loads the variables by the names in co_names
+    return code.replace(co_names=tuple(renamed.get(name, name)
+                                       for name in code.co_names))
+
+
+def _eval_vm(code, consts, var_values):
+    """
+    Run bytecode produced by compile_expr and return the result.
+    The function uses stack for calculation.
+
+    Arguments:
+    code -- array of opcodes with their arguments;
+    consts -- the integer literals;
+    var_values -- values of the variables, indexed like 'names'.
+    Return value:
+    calculated result.
+    """
+    stack = []
+    _append = stack.append
+    _pop = stack.pop
+    ip = 0
+    end = len(code)
+    while ip < end:
+        op = code[ip]
+        if op < ADD:
+            if op == PUSH_CONST:
+                _append(consts[code[ip + 1]])
+            else:
+                _append(var_values[code[ip + 1]])
+            ip += 2
+            continue
+        if op == NEG:
+            stack[-1] = -stack[-1]
+            ip += 1
+            continue
+        b = _pop()
+        a = _pop()
+        if op == ADD:
+            _append(a + b)
+        elif op == SUB:
+            _append(a - b)
+        elif op == MUL:
+            _append(a * b)
+        elif op == DIV:
+            _append(a // b)
+        else:
+            _append(a ** b)
+        ip += 1
+    return _pop()
+
+
+if njit is not None:
+    _INT64_MIN = -2 ** 63
+    _INT64_MAX = 2 ** 63 - 1
+
+    # the overflow checks come before the operations: LLVM assumes
+    # signed arithmetic does not overflow and drops checks made after
+
+    @njit(cache=True)
+    def _mul_int64(a, b):
+        # the product and whether it fits in int64; a product of
+        # INT64_MIN (other than by 0 or 1) is left to _eval_vm
+        if a == 0 or b == 0:
+            return 0, True
+        if a == _INT64_MIN or b == _INT64_MIN:
+            if a == 1 or b == 1:
+                return a * b, True
+            return 0, False
+        if abs(a) > _INT64_MAX // abs(b):
+            return 0, False
+        return a * b, True
+
+    @njit(cache=True)
+    def _eval_vm_jit(code, consts, var_values):
+        # the same loop as _eval_vm over a preallocated int64 stack;
+        # return (result, True), or (0, False) if a value does not fit
+        # in int64 or is not an integer, to be redone by _eval_vm
+        stack = np.empty(code.shape[0], dtype=np.int64)
+        sp = 0
+        ip = 0
+        while ip < code.shape[0]:
+            op = code[ip]
+            if op == PUSH_CONST:
+                stack[sp] = consts[code[ip + 1]]
+                sp += 1
+                ip += 2
+            elif op == LOAD_VAR:
+                stack[sp] = var_values[code[ip + 1]]
+                sp += 1
+                ip += 2
+            elif op == NEG:
+                if sp < 1:
+                    raise IndexError("pop from empty stack")
+                if stack[sp - 1] == _INT64_MIN:
+                    return 0, False
+                stack[sp - 1] = -stack[sp - 1]
+                ip += 1
+            else:
+                if sp < 2:
+                    raise IndexError("pop from empty stack")
+                sp -= 1
+                b = stack[sp]
+                a = stack[sp - 1]
+                if op == ADD:
+                    if (b > 0 and a > _INT64_MAX - b) \
+                            or (b < 0 and a < _INT64_MIN - b):
+                        return 0, False
+                    r = a + b
+                elif op == SUB:
+                    if (b < 0 and a > _INT64_MAX + b) \
+                            or (b > 0 and a < _INT64_MIN + b):
+                        return 0, False
+                    r = a - b
+                elif op == MUL:
+                    r, ok = _mul_int64(a, b)
+                    if not ok:
+                        return 0, False
+                elif op == DIV:
+                    # division by zero is raised by _eval_vm
+                    if b == 0 or (b == -1 and a == _INT64_MIN):
+                        return 0, False
+                    r = a // b
+                else:
+                    if b < 0:
+                        return 0, False
+                    r = 1
+                    while b:
+                        if b & 1:
+                            r, ok = _mul_int64(r, a)
+                            if not ok:
+                                return 0, False
+                        b >>= 1
+                        if b:
+                            a, ok = _mul_int64(a, a)
+                            if not ok:
+                                return 0, False
+                stack[sp - 1] = r
+                ip += 1
+        if sp != 1:
+            raise IndexError("unbalanced stack")
+        return stack[0], True
+
+
+# _native_program(code, consts) prepares a compiled program for the
+# native VM, or returns None if the program cannot run there, and
+# _run_native(native, var_values) runs it, or returns None if a value
+# does not fit in a machine integer. The caller then uses _eval_vm.
+if _FastVM is not None:
+    def _native_program(code, consts):
+        """
+        Return the Cython VM of a compiled program,
+        or None if its constants do not fit in C long.
+        """
+        try:
+            return _FastVM(code, array('l', consts))
+        except OverflowError:
+            return None
+
+    def _run_native(native, var_values):
+        """
+        Run a program on its Cython VM. Return None if a value does
+        not fit in C long or the result is not an integer.
+        """
+        try:
+            return native.eval(array('l', var_values))
+        except (OverflowError, ValueError):
+            return None
+elif njit is not None:
+    def _native_program(code, consts):
+        """
+        Return the code and constants of a compiled program as arrays
+        for the Numba VM, or None if the constants do not fit in int64.
+        """
+        try:
+            return (np.frombuffer(code, dtype=np.int32),
+                    np.array(consts, dtype=np.int64))
+        except OverflowError:
+            return None
+
+    def _run_native(native, var_values):
+        """
+        Run a program on the Numba VM. Return None if a value does
+        not fit in int64 or the result is not an integer.
+        """
+        try:
+            var_values = np.array(var_values, dtype=np.int64)
+        except OverflowError:
+            return None
+        result, ok = _eval_vm_jit(native[0], native[1], var_values)
+        return int(result) if ok else None
+
+
 class Calculator:
     """
     The Calculator class which works with variables.
@@ -154,34 +590,42 @@ class Calculator:
         """
         self.run = True
         self.variables = {}
+        # sys.stdin may be replaced by an object without isatty(),
+        # e.g. the input mock of the stage tests: read it with input()
+        isatty = getattr(sys.stdin, 'isatty', None)
+        self.interactive = isatty is None or isatty()
 
     def assign_valid(self, cmd_arr):
         """
         Evaluate the correctness of an assignment command.
-        Raise corresponding exception if the format is invalid.
+        Return the corresponding error code if the format is invalid.
 
         Arguments:
         cmd_arr -- array of a variable and a value (number/variable)
-        Return value: None
+        Return value:
+        None if the assignment is valid, else ASSIGNMENT_ERROR,
+        IDENTIFIER_ERROR or UNKNOWN_VAR_ERROR.
         """
         if len(cmd_arr) != 2:
-            raise AssignmentError
+            return ASSIGNMENT_ERROR
         identifier, value = cmd_arr
         # check for identifier correctness
         if not identifier.isalpha():
-            raise IdentifierError
-        if not value.lstrip("-").isdigit():
-            # if the value is not digit and
-            # not a valid name, raise AssignmentError
+            return IDENTIFIER_ERROR
+        if parse_int(value) is None:
+            # if the value is not a number and
+            # not a valid name, return ASSIGNMENT_ERROR
             if not value.isalpha():
-                raise AssignmentError
+                return ASSIGNMENT_ERROR
             # else check the value's name in dictionary
             if value not in self.variables:
-                raise UnknownVarError
+                return UNKNOWN_VAR_ERROR
+        return None
 
     def assign(self, identifier, value):
         """
-        Adds a new variable with a value to the 'variables' dictionary.
+        Adds a new variable with an integer value
+        to the 'variables' dictionary.
 
         Arguments:
         identifier -- the variable's name;
@@ -189,8 +633,9 @@ class Calculator:
                  or a variable from the dictionary.
         Return value: None
         """
-        if value.lstrip("-").isdigit():
-            self.variables[identifier] = value
+        number = parse_int(value)
+        if number is not None:
+            self.variables[identifier] = number
         else:
             self.variables[identifier] = self.variables[value]
 
@@ -217,26 +662,62 @@ class Calculator:
         else:
             raise CommandException
 
-    def calculate_postfix(self, postfix):
+    def calculate_postfix(self, program):
         """
-        Calculate a postfix expression and return the result.
-        The function uses stack for calculation.
+        Run compiled bytecode and return the result.
+        Variables are passed to the VM by their slots in 'names'.
 
         Arguments:
-        postfix -- expression in array format.
+        program -- (code, consts, names, native) returned by compile_expr.
         Return value:
         calculated result.
         """
-        stack = deque()
-        for el in postfix:
-            if el.lstrip("-").isdigit():
-                stack.append(el)
-            elif el.isalpha():
-                stack.append(self.variables[el])
-            else:
-                b, a = stack.pop(), stack.pop()
-                stack.append(eval(f"{a} {el} {b}"))
-        return int(stack.pop())
+        code, consts, names, native = program
+        # constant expressions are folded by compile_expr
+        if not names:
+            return consts[0]
+        vars_ = self.variables
+        var_values = [vars_[name] for name in names]
+        if native is not None:
+            result = _run_native(native, var_values)
+            if result is not None:
+                return result
+        return _eval_vm(code, consts, var_values)
+
+    def calculate(self, expr):
+        """
+        Compile a calculation expression (cached) and calculate it.
+        The expression runs as the Python code object lowered from
+        the bytecode of compile_expr. On expressions of the usual size
+        it is several times faster than the native VMs, whose calls and
+        conversions of the values cost more than the calculation, and
+        it never overflows.
+
+        Arguments:
+        expr -- a string expression to be evaluated.
+        Return value:
+        calculated result.
+        """
+        return eval(_safe_compile(expr), _EVAL_GLOBALS, self.variables)
+
+    def read_input(self):
+        """
+        Yield the user's input lines while the calculator runs.
+        An interactive session (or a stdin that is not a real stream)
+        reads with input() to keep the readline editing, otherwise
+        (pipes, scripts) sys.stdin is iterated directly.
+
+        Return value:
+        generator of the input lines without the trailing newline.
+        """
+        if self.interactive:
+            while self.run:
+                yield input()
+        else:
+            for raw in sys.stdin:
+                yield raw.rstrip('\n')
+                if not self.run:
+                    break
 
     def run_calc(self):
         """
@@ -247,37 +728,37 @@ class Calculator:
         - a number or a variable -> print it and continue;
         - an assignment -> check the format and assign;
         - a command -> if the command exists, execute;
-        - a calculation expression -> convert to array,
-        convert to postfix, and calculate the postfix.
+        - a calculation expression -> compile (cached),
+        and calculate the compiled expression.
         Return value: None
         """
-        while self.run:
-            inp = input()
-
-            if is_empty(inp):
+        for inp in self.read_input():
+            if not inp:
                 continue
 
-            elif inp.lstrip('-').isdigit():
+            # check the first character before stripping the input
+            elif (inp[0] == '-' or inp[0].isdigit()) \
+                    and inp.lstrip('-').isdigit():
                 print(inp)
 
             elif is_variable(inp):
-                try:
-                    print(self.variables[inp.replace(' ', '')])
-                except KeyError:
-                    uve = UnknownVarError()
-                    print(uve)
+                if ' ' in inp:
+                    inp = inp.replace(' ', '')
+                val = self.variables.get(inp)
+                if val is None:
+                    print(UnknownVarError())
                     continue
+                print(val)
 
             elif is_assignment(inp):
                 inp = inp.replace("=", " ").split()
-                try:
-                    # check for input correctness, raise
-                    # error if not correct, else assign
-                    self.assign_valid(inp)
-                    self.assign(*inp)
-                except Exception as e:
-                    print(e)
+                # check for input correctness, print
+                # error if not correct, else assign
+                error = self.assign_valid(inp)
+                if error is not None:
+                    print(_ASSIGN_ERRORS[error])
                     continue
+                self.assign(*inp)
 
             elif is_command(inp):
                 try:
@@ -287,13 +768,15 @@ class Calculator:
 
             else:
                 try:
-                    check_expr(inp)
+                    result = self.calculate(inp)
                 except ExpressionError as ee:
                     print(ee)
                     continue
-                expr = to_array(inp)
-                postfix = to_postfix(expr)
-                print(self.calculate_postfix(postfix))
+                except (KeyError, NameError):
+                    uve = UnknownVarError()
+                    print(uve)
+                    continue
+                print(result)
 
 
 def main():
@@ -0,0 +1,16 @@
+"""
+Build the optional Cython extension of the calculator in place:
+
+    python setup.py build_ext --inplace
+
+The extension is placed next to calculator.py, where it is imported
+both by 'python -m calculator.calculator' and by the script itself.
+"""
+from setuptools import Extension, setup
+from Cython.Build import cythonize
+
+setup(
+    name="smart-calculator",
+    ext_modules=cythonize(
+        [Extension("calculator._fastcalc", ["calculator/_fastcalc.pyx"])]),
+)
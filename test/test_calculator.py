@@ -0,0 +1,256 @@
+import random
+import unittest
+from array import array
+from unittest import mock
+
+import calculator.calculator as calc
+from calculator.calculator import PUSH_CONST, ExpressionError, compile_expr, \
+    to_array, _eval_vm, _safe_compile, _EVAL_GLOBALS
+
+try:
+    from calculator import _fastcalc
+except ImportError:
+    _fastcalc = None
+
+VARIABLES = {'a': 7, 'b': 2, 'n': -3}
+EXPRESSIONS = ('33 + 20 + 11 + 49 - n - 9 + 1 - 80 + 4',
+               '5 --- 2 ++++++ 4 -- 2 ---- 1',
+               '3 + 8 * ((4 + 3) * 2 + 1) - 6 / (2 + 1)',
+               'a * 4 / b - (3 - 1)', '2 ^ 3 ^ 2', '-a ^ b', '(-a) ^ b',
+               '-3 + 2', '3 * -2', '-(a + b)', 'a - -b', '-7 / 2',
+               '+a - - n', 'b ^ -1', 'n / b * a ^ 0')
+# expressions whose values do not fit in 64-bit integers
+OVERFLOWS = ('a ^ 40', 'a ^ 50', 'a + 99999999999999999999',
+             'n * 9999999999 * 9999999999', '-(a ^ 23 * 1000)',
+             'a + 9223372036854775801', 'n - 9223372036854775806')
+
+
+def run_vm(expr, variables):
+    code, consts, names, _ = compile_expr(expr)
+    return _eval_vm(code, consts, [variables[name] for name in names])
+
+
+def random_expr(rng, depth=3):
+    """
+    Return a random valid expression of the variables of VARIABLES.
+    """
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(('a', 'b', 'n', str(rng.randint(0, 99))))
+    op = rng.choice('+-*/^~')
+    if op == '~':
+        return '-' + random_expr(rng, depth - 1)
+    if op == '^':
+        return f'({random_expr(rng, depth - 1)}) ^ {rng.randint(0, 5)}'
+    return f'({random_expr(rng, depth - 1)}) {op} ' \
+           f'({random_expr(rng, depth - 1)})'
+
+
+def random_text(rng):
+    """
+    Return a random string of the characters of expressions.
+    """
+    # with a non-ASCII digit, letter and numeric character
+    return ''.join(rng.choice('0123456789ab+-*/^() x\t\u0663\u00e9\u00b2')
+                   for _ in range(rng.randint(0, 20)))
+
+
+def outcome(func, *args):
+    """
+    Return the result of func(*args), or the type of its exception.
+    """
+    try:
+        return func(*args)
+    except (ExpressionError, ZeroDivisionError) as e:
+        return type(e)
+
+
+def tokenize_re(expr):
+    """
+    Tokenize with the regex scan of to_array only.
+    """
+    with mock.patch.object(calc, '_fast_tokenize', None), \
+            mock.patch.object(calc, '_HS_DB', None):
+        return to_array(expr)
+
+
+def tokenize_hs(expr):
+    """
+    Tokenize with the Hyperscan scan of to_array, where it applies.
+    """
+    with mock.patch.object(calc, '_fast_tokenize', None), \
+            mock.patch.object(calc, 'USE_HYPERSCAN', True):
+        return to_array(expr)
+
+
+class CompileTest(unittest.TestCase):
+    # malformed expressions are rejected before being folded or run
+    def test_malformed(self):
+        for expr in ('()', '2 +', '2 3', '2(3)', '(a)(b)', '* 2', '(2 -)'):
+            with self.subTest(expr=expr):
+                with self.assertRaises(ExpressionError):
+                    compile_expr(expr)
+
+    # the Python code object and the bytecode VM give the same results
+    def test_code_object_matches_vm(self):
+        for expr in EXPRESSIONS:
+            with self.subTest(expr=expr):
+                self.assertEqual(
+                    eval(_safe_compile(expr), _EVAL_GLOBALS, VARIABLES),
+                    run_vm(expr, VARIABLES))
+
+    # variables named like Python constants are variables as well
+    def test_constant_names(self):
+        variables = {'True': 5, 'None': 2, 'a': 7}
+        for expr in ('True + 1', 'None * True - a', '-None ^ True'):
+            with self.subTest(expr=expr):
+                self.assertEqual(
+                    eval(_safe_compile(expr), _EVAL_GLOBALS, variables),
+                    run_vm(expr, variables))
+        with self.assertRaises(NameError):
+            eval(_safe_compile('False + 1'), _EVAL_GLOBALS, variables)
+
+    # variables may have non-ASCII letters, as identifiers do
+    def test_non_ascii_names(self):
+        variables = {'\u00e9': 5, 'x\u00e9y': 2}
+        self.assertEqual(run_vm('\u00e9 + 1', variables), 6)
+        self.assertEqual(run_vm('x\u00e9y * \u00e9', variables), 10)
+
+    # unary minus binds tighter than '*' but looser than '^'
+    def test_unary_minus(self):
+        self.assertEqual(run_vm('-3 + 2', VARIABLES), -1)
+        self.assertEqual(run_vm('-a ^ b', VARIABLES), -49)
+        self.assertEqual(run_vm('-a * b', VARIABLES), -14)
+        self.assertEqual(run_vm('a - -b', VARIABLES), 9)
+
+    # expressions without variables are folded to a single constant
+    def test_constant_folding(self):
+        code, consts, names, native = \
+            compile_expr('3 + 8 * ((4 + 3) * 2 + 1)')
+        self.assertEqual(list(code), [PUSH_CONST, 0])
+        self.assertEqual(consts, (123,))
+        self.assertEqual(names, ())
+        self.assertIsNone(native)
+
+
+class AssignTest(unittest.TestCase):
+    # values are numbers only if int() parses them
+    def test_values(self):
+        calculator = calc.Calculator()
+        for value, error in (('-5', None), ('12', None),
+                             ('--5', calc.ASSIGNMENT_ERROR),
+                             ('\u00b2', calc.ASSIGNMENT_ERROR)):
+            with self.subTest(value=value):
+                self.assertEqual(calculator.assign_valid(['a', value]),
+                                 error)
+        calculator.assign('a', '-5')
+        self.assertEqual(calculator.variables, {'a': -5})
+
+
+@unittest.skipUnless(calc._NATIVE_VM, "no native VM is installed")
+class NativeVMTest(unittest.TestCase):
+    # the native VM (with its fallback) gives the results of _eval_vm
+    def test_matches_pure_vm(self):
+        calculator = calc.Calculator()
+        calculator.variables = dict(VARIABLES)
+        rng = random.Random(0)
+        exprs = EXPRESSIONS + OVERFLOWS \
+            + tuple(random_expr(rng) for _ in range(2000))
+        for expr in exprs:
+            with self.subTest(expr=expr):
+                self.assertEqual(
+                    outcome(calculator.calculate_postfix, compile_expr(expr)),
+                    outcome(run_vm, expr, VARIABLES))
+
+
+@unittest.skipUnless(calc.njit, "numba is not installed")
+class NumbaTest(unittest.TestCase):
+    # the Numba kernel gives the results of _eval_vm or reports overflow
+    def test_kernel(self):
+        np = calc.np
+        rng = random.Random(0)
+        exprs = EXPRESSIONS + OVERFLOWS \
+            + tuple(random_expr(rng) for _ in range(2000))
+        for expr in exprs:
+            with self.subTest(expr=expr):
+                code, consts, names, _ = compile_expr(expr + ' + a * 0')
+                expected = outcome(run_vm, expr, VARIABLES)
+                try:
+                    consts = np.array(consts, dtype=np.int64)
+                except OverflowError:
+                    continue
+                result, ok = calc._eval_vm_jit(
+                    np.frombuffer(code, dtype=np.int32), consts,
+                    np.array([VARIABLES[name] for name in names],
+                             dtype=np.int64))
+                if ok:
+                    self.assertEqual(result, expected)
+                else:
+                    # only non-integer results and values beyond int64
+                    # are left to _eval_vm
+                    self.assertFalse(expr in EXPRESSIONS
+                                     and type(expected) is int)
+
+    # a unary minus and overflow do not read or return garbage
+    def test_underflow_and_overflow(self):
+        calculator = calc.Calculator()
+        calculator.variables = {'a': 3}
+        self.assertEqual(calculator.calculate_postfix(
+            compile_expr('-a + 1')), -2)
+        self.assertEqual(calculator.calculate_postfix(
+            compile_expr('a ^ 50')), 3 ** 50)
+
+
+@unittest.skipUnless(calc._HS_DB, "hyperscan is not installed")
+class HyperscanTest(unittest.TestCase):
+    # the Hyperscan scan gives the matches of _TOKEN_RE.finditer
+    # for ASCII expressions, and to_array the tokens of the regex scan
+    def test_tokenize_matches_finditer(self):
+        rng = random.Random(0)
+        texts = EXPRESSIONS + ('***', '2 *** 3', '+-+-', '(a)) ^^ b',
+                               '\u0663\u0661 + 4', 'x\u00e9y') \
+            + tuple(random_text(rng) for _ in range(20000))
+        for text in texts:
+            with self.subTest(text=text):
+                if text.isascii():
+                    self.assertEqual(
+                        calc._tokenize_hs(text),
+                        [(m.lastindex, m.group())
+                         for m in calc._TOKEN_RE.finditer(text)])
+                self.assertEqual(outcome(tokenize_hs, text),
+                                 outcome(tokenize_re, text))
+
+
+@unittest.skipUnless(_fastcalc, "the Cython extension is not built")
+class CythonTest(unittest.TestCase):
+    # the Cython tokenizer gives the tokens of the regex scan
+    def test_tokenize_matches_regex(self):
+        rng = random.Random(0)
+        texts = EXPRESSIONS + tuple(random_text(rng) for _ in range(20000))
+        for text in texts:
+            with self.subTest(text=text):
+                try:
+                    tokens = _fastcalc.tokenize(text)
+                except ValueError:
+                    tokens = ExpressionError
+                self.assertEqual(tokens, outcome(tokenize_re, text))
+
+    # the Cython VM gives the results of _eval_vm or raises OverflowError
+    def test_vm(self):
+        for expr in EXPRESSIONS + OVERFLOWS:
+            with self.subTest(expr=expr):
+                code, consts, names, _ = compile_expr(expr + ' + a * 0')
+                values = array('l', (VARIABLES[name] for name in names))
+                expected = run_vm(expr, VARIABLES)
+                try:
+                    vm = _fastcalc.VM(code, array('l', consts))
+                    result = vm.eval(values)
+                except OverflowError:
+                    self.assertIn(expr, OVERFLOWS)
+                except ValueError:
+                    self.assertIsInstance(expected, float)
+                else:
+                    self.assertEqual(result, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()